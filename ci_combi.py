@@ -14,11 +14,41 @@ patrick.wang@chem.ox.ac.uk
 
 
 
-from itertools import combinations, product
-from typing import List, Dict, Tuple, Set
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, islice, product
+from math import comb
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from collections import defaultdict, deque
+import os
 
 
+# Occupation bytes used when building configuration strings
+DOUBLE = ord('2')
+ALPHA = ord('a')
+BETA = ord('b')
+
+# Largest number of configurations generated by one worker task
+RANGE_SIZE = 20000
+
+
+def nth_combination(iterable: Iterable, r: int, index: int) -> tuple:
+    """Equivalent to list(combinations(iterable, r))[index] (itertools recipe)."""
+    pool = tuple(iterable)
+    n = len(pool)
+    c = comb(n, r)
+    if index < 0:
+        index += c
+    if index < 0 or index >= c:
+        raise IndexError
+    result = []
+    while r:
+        c, n, r = c * r // n, n - 1, r - 1
+        while index >= c:
+            index -= c
+            c, n = c * (n - r) // n, n - 1
+        result.append(pool[-1 - n])
+    return tuple(result)
+
 
 class ConfigurationGenerator:
     def __init__(self, total_electrons: int, frozen_core: int, irrep_specs: Dict[str, int]):
@@ -43,52 +73,138 @@ class ConfigurationGenerator:
         for irrep, count in irrep_specs.items():
             self.irrep_positions.append((pos, pos + count))
             pos += count
+        
+        # Configurations are written straight into the formatted layout: an
+        # empty configuration with spaces between irrep groups, and the byte
+        # offset of each orbital within it
+        self._blank = ' '.join('0' * count for count in irrep_specs.values()).encode('ascii')
+        self._orbital_offsets = [orbital + group
+                                 for group, (start, end) in enumerate(self.irrep_positions)
+                                 for orbital in range(start, end)]
     
-    def _format_configuration(self, distribution: List[str]) -> str:
-        """Format the distribution with spaces between irrep groups."""
-        result = []
-        for start, end in self.irrep_positions:
-            result.append(''.join(distribution[start:end]))
-        return ' '.join(result)
-    
-    def _generate_spin_distributions(self) -> Set[str]:
-        """Generate possible distributions of alpha and beta electrons."""
+    def _shell_sizes(self, n_double: int) -> Tuple[int, int, int]:
+        """Number of double, alpha-single and beta-single choices in a shell."""
         n_alpha = self.active_electrons // 2
         n_beta = self.active_electrons - n_alpha
-        distributions = set()
-        
-        # Generate all possible alpha electron positions
-        for alpha_pos in combinations(range(self.n_orbitals), n_alpha):
-            # Then, for each alpha distribution, generate beta positions
-            for beta_pos in combinations(range(self.n_orbitals), n_beta):
-                # Create the orbital string
-                dist = ['0'] * self.n_orbitals
-                
-                # Place alpha electrons
+        n = self.n_orbitals
+        return (comb(n, n_double),
+                comb(max(n - n_double, 0), n_alpha - n_double),
+                comb(max(n - n_alpha, 0), n_beta - n_double))
+
+    def _count_configurations(self) -> int:
+        """Total number of configurations over all shells."""
+        n_alpha = self.active_electrons // 2
+        n_beta = self.active_electrons - n_alpha
+        return sum(n_doubles * n_alphas * n_betas
+                   for n_doubles, n_alphas, n_betas in map(self._shell_sizes,
+                                                            range(min(n_alpha, n_beta) + 1)))
+
+    def _iter_range(self, start: int, stop: int) -> Iterator[str]:
+        """Yield configurations start to stop of the full enumeration.
+
+        Configurations are ranked by number of doubly occupied orbitals, then
+        by the double, alpha and beta orbital combinations in lexicographic
+        order. The double and alpha choices are unranked with nth_combination
+        wherever a run of beta combinations begins, so any range can be
+        generated without enumerating what comes before it.
+        """
+        n_alpha = self.active_electrons // 2
+        n_beta = self.active_electrons - n_alpha
+        blank = self._blank
+        orbitals = self._orbital_offsets
+        double, alpha, beta = DOUBLE, ALPHA, BETA
+
+        index = start
+        n_double = 0
+        shell_start = 0
+        while index < stop:
+            # Find the shell containing index
+            n_doubles, n_alphas, n_betas = self._shell_sizes(n_double)
+            shell_size = n_doubles * n_alphas * n_betas
+            if index >= shell_start + shell_size:
+                shell_start += shell_size
+                n_double += 1
+                continue
+
+            double_rank, rest = divmod(index - shell_start, n_alphas * n_betas)
+            alpha_rank, beta_rank = divmod(rest, n_betas)
+
+            # Doubly occupied orbitals, then alpha singles from those left over
+            double_pos = nth_combination(orbitals, n_double, double_rank)
+            double_set = set(double_pos)
+            remaining = [i for i in orbitals if i not in double_set]
+            alpha_pos = nth_combination(remaining, n_alpha - n_double, alpha_rank)
+            alpha_set = set(alpha_pos)
+            beta_remaining = [i for i in remaining if i not in alpha_set]
+
+            # The run of beta singles sharing these double and alpha orbitals
+            n_run = min(n_betas - beta_rank, stop - index)
+            for beta_pos in islice(combinations(beta_remaining, n_beta - n_double),
+                                   beta_rank, beta_rank + n_run):
+                # Create the formatted orbital string as bytes
+                dist = bytearray(blank)
+                for pos in double_pos:
+                    dist[pos] = double
                 for pos in alpha_pos:
-                    dist[pos] = 'a'
-                
-                # Place beta electrons
-                valid_config = True
+                    dist[pos] = alpha
                 for pos in beta_pos:
-                    if dist[pos] == '0':
-                        dist[pos] = 'b'
-                    elif dist[pos] == 'a':
-                        dist[pos] = '2'  # Doubly occupied orbital
-                    else:
-                        valid_config = False
-                        break
-                
-                if valid_config:
-                    # Format with proper spacing between irreps
-                    config = self._format_configuration(dist)
-                    distributions.add(config)
-        
-        return distributions
+                    dist[pos] = beta
+
+                yield dist.decode('ascii')
+            index += n_run
+
+    def _generate_range(self, bounds: Tuple[int, int]) -> List[str]:
+        """Worker entry point: one range of configurations as a list."""
+        return list(self._iter_range(*bounds))
+
+    def _iter_spin_distributions(self, n_workers: Optional[int] = None) -> Iterator[str]:
+        """Yield possible distributions of alpha and beta electrons.
+
+        Configurations are enumerated directly by the number of doubly
+        occupied orbitals, so every configuration is produced exactly once.
+        The enumeration is split into equal index ranges which worker
+        processes generate independently, with at most two ranges per worker
+        in flight so finished results do not pile up ahead of the consumer;
+        n_workers=1 generates everything lazily in this process.
+        """
+        total = self._count_configurations()
+
+        if n_workers == 1:
+            yield from self._iter_range(0, total)
+            return
 
-    def generate_configurations(self) -> Set[str]:
-        """Generate all possible electronic configurations."""
-        return self._generate_spin_distributions()
+        # At least one range per worker, and none larger than RANGE_SIZE
+        n_workers = n_workers or os.cpu_count() or 1
+        n_ranges = max(n_workers, -(-total // RANGE_SIZE))
+        bounds = [total * k // n_ranges for k in range(n_ranges + 1)]
+        ranges = zip(bounds[:-1], bounds[1:])
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # A bounded window of futures, consumed oldest first to keep order
+            pending = deque(executor.submit(self._generate_range, bounds)
+                            for bounds in islice(ranges, 2 * n_workers))
+            while pending:
+                configs = pending.popleft().result()
+                for bounds in islice(ranges, 1):
+                    pending.append(executor.submit(self._generate_range, bounds))
+                yield from configs
+
+    def iter_configurations(self, n_workers: Optional[int] = None) -> Iterator[str]:
+        """Yield all possible electronic configurations without storing them.
+
+        Args:
+            n_workers: Number of worker processes, default one per CPU.
+                       Use 1 to generate in the calling process.
+        """
+        return self._iter_spin_distributions(n_workers)
+
+    def generate_configurations(self, n_workers: Optional[int] = None) -> List[str]:
+        """Generate all possible electronic configurations.
+
+        Args:
+            n_workers: Number of worker processes, default one per CPU.
+                       Use 1 to generate in the calling process.
+        """
+        return list(self._iter_spin_distributions(n_workers))
 
 def main():
     # Example usage for Ne system
@@ -108,15 +224,22 @@ def main():
         irrep_specs=irrep_specs
     )
     
-    configurations = generator.generate_configurations()
+    # Stream configurations to disk in batches, one bulk write per batch
+    configurations = generator.iter_configurations()
+    n_configurations = 0
+    first_configurations = []
+    with open('configurations.txt', 'w', buffering=1 << 20) as f:
+        while batch := list(islice(configurations, 100000)):
+            if not first_configurations:
+                first_configurations = batch[:10]
+            n_configurations += len(batch)
+            f.write('\n'.join(batch))
+            f.write('\n')
     
-    print(f"Generated {len(configurations)} unique configurations:")
+    print(f"Generated {n_configurations} unique configurations:")
     print("\nFirst few configurations:")
-    for config in sorted(configurations)[:10]:  # Show first 10 configurations
+    for config in first_configurations:  # Show first 10 configurations
         print(f"{config}")
-    with open('configurations.txt', 'w') as f:
-        for config in configurations:
-            f.write(f"{config}\n")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
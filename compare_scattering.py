@@ -10,58 +10,19 @@ patrick.wang@chem.ox.ac.uk
 """
 
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 import colorcet as cc
 import seaborn as sns
 import sys
-import scipy.integrate as spi
+from sine_transform import calc_pdfs
 
 sns.set_palette(cc.glasbey_bw)
 
-def integrate(y, dx):
-    #  return np.sum(y) * dx
-    return spi.trapezoid(y, dx=dx)
-
-def calc_pdf(data):
-    """
-    Calculate the PDF of the data using the sine transform.
-
-    Parameters
-    ----------
-    data : np.ndarray
-        The data to calculate the PDF of. Can be directly read from a file using np.loadtxt.
-        Atomic units are assumed.
-
-    Returns
-    -------
-    r : np.ndarray
-        The r values of the PDF.
-    pdf : np.ndarray
-        The PDF values.
-    V_ee_int : np.ndarray
-        The integrand of the electron-electron interaction energy.
-    
-    """
-    q = data[:, 0]
-    dq = data[1, 0] - data[0, 0]
-    no_points = len(q)
-    r = np.linspace(0, 1 / dq, no_points)
-    pdf = np.zeros_like(r)
-    for i, rr in enumerate(r):
-        integrand = data[:, 1] * np.sin(rr * q) * q
-        pdf[i] = 1 / np.pi * rr * integrate(integrand, dq)
-    integral = integrate(pdf, r[1] - r[0])
-    print(f"Integral = {integral:10.8f}")
-
-    V_ee_int = np.zeros_like(pdf)
-    V_ee_int[1:] = pdf[1:] / r[1:]
-    V_ee = integrate(V_ee_int, r[1] - r[0])
-    print(f"V_ee     = {V_ee:10.8f}")
-    return r, pdf, V_ee_int
-
-
 def read_file(file):
-    return np.loadtxt(file)
+    # pandas' C parser; np.loadtxt parses in pure Python before NumPy 1.23
+    return pd.read_csv(file, sep=r'\s+', header=None, comment='#',
+                       dtype=np.float64).to_numpy()
 
 def sine_transform(data):
     return np.fft.fft(data)
@@ -80,10 +41,9 @@ def main():
 
     data1 = read_file(file1)
     data2 = read_file(file2)
-    pdf1 = calc_pdf(data1)
-    pdf2 = calc_pdf(data2)
-    r1, pdf1, V_ee_int1 = pdf1
-    r2, pdf2, V_ee_int2 = pdf2
+    # Both datasets share the q-grid, so transform them together and
+    # evaluate each sine only once
+    (r1, pdf1), (r2, pdf2) = calc_pdfs([data1, data2], return_integrand=False)
 
     fig, ax = plt.subplots(2, 2, figsize=(12, 12))
     ax[0,1].plot(r1, pdf1, label=file1_label)
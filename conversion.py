@@ -19,15 +19,25 @@ To run:
 
     -o number of orbitals in active space
     -e number electrons in active space
+    -j number of worker processes (optional, default one per CPU)
 
 """
 
 
 import argparse
-from typing import List, Tuple
+from collections import defaultdict
+from functools import partial
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+import multiprocessing
 import sys
 import csv
 
+import numpy as np
+
+# Occupation character indexed by (alpha bit << 1) | beta bit
+OCCUPATION_CHARS = '0ba2'
+
 class CIConverter:
     def __init__(self, n_orbitals: int, n_electrons: int):
         """
@@ -51,37 +61,59 @@ class CIConverter:
         Returns:
             String in occupation notation (2,a,b,0)
         """
-        # Initialize all orbitals as empty
-        occupation = ['0'] * self.n_orbitals
-        
-        # Process alpha electrons
-        for orbital_idx in det_alpha:
-            if orbital_idx >= self.n_orbitals:
-                raise ValueError(f"Orbital index {orbital_idx} exceeds number of orbitals {self.n_orbitals}")
-            if occupation[orbital_idx] == '0':
-                occupation[orbital_idx] = 'a'
-            elif occupation[orbital_idx] == 'b':
-                occupation[orbital_idx] = '2'
-            else:
-                raise ValueError(f"Invalid: orbital {orbital_idx} already has an alpha electron")
-                
-        # Process beta electrons
-        for orbital_idx in det_beta:
-            if orbital_idx >= self.n_orbitals:
-                raise ValueError(f"Orbital index {orbital_idx} exceeds number of orbitals {self.n_orbitals}")
-            if occupation[orbital_idx] == '0':
-                occupation[orbital_idx] = 'b'
-            elif occupation[orbital_idx] == 'a':
-                occupation[orbital_idx] = '2'
-            else:
-                raise ValueError(f"Invalid: orbital {orbital_idx} already has a beta electron")
+        # Occupied orbitals as bitmasks, one per spin
+        amask = self._to_mask(det_alpha, 'an alpha')
+        bmask = self._to_mask(det_beta, 'a beta')
         
         # Verify electron count
-        n_electrons_found = sum(2 if x == '2' else 1 if x in ['a', 'b'] else 0 for x in occupation)
+        n_electrons_found = len(det_alpha) + len(det_beta)
         if n_electrons_found != self.n_electrons:
             raise ValueError(f"Expected {self.n_electrons} electrons but found {n_electrons_found}")
+        
+        return ''.join(OCCUPATION_CHARS[((amask >> i) & 1) << 1 | ((bmask >> i) & 1)]
+                       for i in range(self.n_orbitals))
+    
+    def dets_to_occupations(self, dets_alpha: np.ndarray, dets_beta: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert many determinants with the same electron counts at once.
+        
+        Args:
+            dets_alpha: (N, n_alpha) array of orbital indices occupied by alpha electrons
+            dets_beta: (N, n_beta) array of orbital indices occupied by beta electrons
             
-        return ''.join(occupation)
+        Returns:
+            Array of N occupation strings, and a boolean mask of the rows that
+            are valid. Invalid rows can be passed to det_to_occupation for the
+            specific error.
+        """
+        n_dets = len(dets_alpha)
+        occupied = []
+        valid = np.full(n_dets, dets_alpha.shape[1] + dets_beta.shape[1] == self.n_electrons)
+        for dets in (dets_alpha, dets_beta):
+            in_range = ((dets >= 0) & (dets < self.n_orbitals)).all(axis=1)
+            occ = np.zeros((n_dets, self.n_orbitals), dtype=np.uint8)
+            np.put_along_axis(occ, np.where(in_range[:, None], dets, 0), 1, axis=1)
+            # A repeated orbital within one spin leaves fewer bits set
+            valid &= in_range & (occ.sum(axis=1) == dets.shape[1])
+            occupied.append(occ)
+        
+        code = (occupied[0] << 1) | occupied[1]
+        chars = np.array(list(OCCUPATION_CHARS))[code]
+        return chars.view(f'U{self.n_orbitals}').ravel(), valid
+    
+    def _to_mask(self, det: List[int], spin: str) -> int:
+        """Build the occupation bitmask of one spin, checking each orbital index."""
+        mask = 0
+        for orbital_idx in det:
+            if orbital_idx >= self.n_orbitals:
+                raise ValueError(f"Orbital index {orbital_idx} exceeds number of orbitals {self.n_orbitals}")
+            if orbital_idx < 0:
+                raise ValueError(f"Orbital index {orbital_idx} is negative")
+            bit = 1 << orbital_idx
+            if mask & bit:
+                raise ValueError(f"Invalid: orbital {orbital_idx} already has {spin} electron")
+            mask |= bit
+        return mask
 
 def parse_determinant(det_str: str) -> List[int]:
     """Parse a determinant string into a list of integers."""
@@ -94,51 +126,115 @@ def parse_determinant(det_str: str) -> List[int]:
     except ValueError as e:
         raise ValueError(f"Error parsing determinant {det_str}: {e}")
 
-def process_input_file(input_path: str, output_path: str, n_orbitals: int, n_electrons: int):
-    """Process the input file and write results to output file."""
+def _parse_line(line: str) -> Optional[Tuple[str, List[str], List[int], List[int], float]]:
+    """Split and parse one input line, warning and returning None if it is unusable."""
+    # Skip empty lines
+    if not line.strip():
+        return None
+    
+    try:
+        # Split line and clean up whitespace
+        parts = [p.strip() for p in line.split() if p.strip()]
+        if len(parts) != 3:
+            print(f"Warning: Skipping malformed line: {line.strip()}", file=sys.stderr)
+            return None
+        
+        # Parse determinants and coefficient
+        return line.strip(), parts, parse_determinant(parts[0]), parse_determinant(parts[1]), float(parts[2])
+    
+    except (ValueError, IndexError) as e:
+        print(f"Warning: Error processing line '{line.strip()}': {e}", file=sys.stderr)
+        return None
+
+def convert_lines(lines: Iterable[str], converter: CIConverter) -> List[list]:
+    """
+    Convert input lines to CSV rows, converting the determinants in bulk.
+    
+    Lines are grouped by their alpha and beta electron counts so each group
+    is converted as one NumPy array; rows come back in input order.
+    """
+    records = [record for record in map(_parse_line, lines) if record is not None]
+    
+    groups = defaultdict(list)
+    for i, (_, _, det_alpha, det_beta, _) in enumerate(records):
+        # Out-of-range indices (which may not even fit in int64) are left
+        # to the scalar conversion below so the line gets its warning
+        indices = det_alpha + det_beta
+        if indices and not 0 <= min(indices) <= max(indices) < converter.n_orbitals:
+            continue
+        groups[len(det_alpha), len(det_beta)].append(i)
+    
+    occupations = [None] * len(records)
+    for (n_alpha, n_beta), rows in groups.items():
+        dets_alpha = np.array([records[i][2] for i in rows], dtype=np.int64).reshape(len(rows), n_alpha)
+        dets_beta = np.array([records[i][3] for i in rows], dtype=np.int64).reshape(len(rows), n_beta)
+        group_occupations, valid = converter.dets_to_occupations(dets_alpha, dets_beta)
+        for i, occupation, ok in zip(rows, group_occupations.tolist(), valid.tolist()):
+            if ok:
+                occupations[i] = occupation
+    
+    results = []
+    for (line, parts, det_alpha, det_beta, coeff), occupation in zip(records, occupations):
+        if occupation is None:
+            # Rerun the scalar conversion to report what is wrong with the line
+            try:
+                converter.det_to_occupation(det_alpha, det_beta)
+            except ValueError as e:
+                print(f"Warning: Error processing line '{line}': {e}", file=sys.stderr)
+            continue
+        results.append([parts[0], parts[1], coeff, occupation])
+    return results
+
+def _convert_chunk(lines: List[str], n_orbitals: int, n_electrons: int) -> List[list]:
+    """Worker entry point: convert one chunk of lines with a fresh converter."""
+    return convert_lines(lines, CIConverter(n_orbitals, n_electrons))
+
+def _iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    """Group lines into lists of at most chunk_size."""
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def process_input_file(input_path: str, output_path: str, n_orbitals: int, n_electrons: int,
+                       n_workers: Optional[int] = None, chunk_size: int = 50000):
+    """
+    Process the input file and write results to output file.
+    
+    The input is read in chunks of chunk_size lines which are converted by a
+    pool of n_workers processes (default: one per CPU) and written in order.
+    Inputs of a single chunk, or n_workers=1, are converted in this process.
+    """
     converter = CIConverter(n_orbitals, n_electrons)
     
     try:
-        with open(input_path, 'r') as infile, open(output_path, 'w') as outfile:
+        with open(input_path, 'r') as infile, \
+                open(output_path, 'w', newline='', buffering=1 << 20) as outfile:
+            writer = csv.writer(outfile, lineterminator='\n')
             # Write header
-            outfile.write("det-alpha,det-beta,CI coefficient,occupation\n")
+            writer.writerow(["det-alpha", "det-beta", "CI coefficient", "occupation"])
             
-            # Skip header if present
+            # Skip header if present; a line without numbers is assumed to be one
             first_line = infile.readline()
-            if not any(c.isdigit() for c in first_line):
-                # Line doesn't contain numbers, assume it's a header
-                pass
+            if any(c.isdigit() for c in first_line):
+                lines = chain([first_line], infile)
             else:
-                # Line contains data, reset to start
-                infile.seek(0)
+                lines = infile
             
-            # Process each line
-            for line in infile:
-                # Skip empty lines
-                if not line.strip():
-                    continue
-                    
-                try:
-                    # Split line and clean up whitespace
-                    parts = [p.strip() for p in line.split() if p.strip()]
-                    if len(parts) != 3:
-                        print(f"Warning: Skipping malformed line: {line.strip()}", file=sys.stderr)
-                        continue
-                    
-                    # Parse determinants and coefficient
-                    det_alpha = parse_determinant(parts[0])
-                    det_beta = parse_determinant(parts[1])
-                    coeff = float(parts[2])
-                    
-                    # Convert to occupation notation
-                    occupation = converter.det_to_occupation(det_alpha, det_beta)
-                    
-                    # Write to output file
-                    outfile.write(f"{parts[0]},{parts[1]},{coeff},{occupation}\n")
-                    
-                except (ValueError, IndexError) as e:
-                    print(f"Warning: Error processing line '{line.strip()}': {e}", file=sys.stderr)
-                    continue
+            chunks = _iter_chunks(lines, chunk_size)
+            first_chunk = next(chunks, [])
+            chunks = chain([first_chunk], chunks)
+            if n_workers == 1 or len(first_chunk) < chunk_size:
+                for chunk in chunks:
+                    writer.writerows(convert_lines(chunk, converter))
+            else:
+                worker = partial(_convert_chunk, n_orbitals=n_orbitals, n_electrons=n_electrons)
+                with multiprocessing.Pool(n_workers) as pool:
+                    # imap keeps the chunks in input order
+                    for rows in pool.imap(worker, chunks, chunksize=1):
+                        writer.writerows(rows)
                     
     except FileNotFoundError:
         print(f"Error: Could not find input file: {input_path}", file=sys.stderr)
@@ -155,11 +251,14 @@ def main():
                       help='Number of orbitals in active space')
     parser.add_argument('--electrons', '-e', type=int, required=True,
                       help='Number of electrons in active space')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                      help='Number of worker processes (default: one per CPU)')
     
     args = parser.parse_args()
     
     try:
-        process_input_file(args.input, args.output, args.orbitals, args.electrons)
+        process_input_file(args.input, args.output, args.orbitals, args.electrons,
+                           n_workers=args.jobs)
         print(f"Successfully converted determinants to occupation notation.")
         print(f"Results written to: {args.output}")
     except Exception as e:
@@ -1,7 +1,7 @@
 import numpy as np
 from pyscf import gto, scf, mcscf, tools
 
-def get_dms(casscf, state=0):
+def get_dms(casscf, state=0, sparse=False, packed=False):
     """
     Calculate the 1- and 2-RDMs for a CASCI calculation.
 
@@ -11,6 +11,10 @@ def get_dms(casscf, state=0):
         The CASCI object.    
     state : int (optional)
         The state for which to calculate the RDMs. Default is 0.    
+    sparse : bool (optional)
+        Return the 2-RDM in the compact form of _make_rdm12_on_mo. Default is False.
+    packed : bool (optional)
+        Return the 2-RDM in pair-packed form (see _make_rdm12_on_mo). Default is False.
     """
     # calculates the dms for the CASCI calculation
     nelecas = casscf.nelecas
@@ -24,12 +28,13 @@ def get_dms(casscf, state=0):
     mo_coeff = casscf.mo_coeff
     nmo = mo_coeff.shape[1]
     casdm1, casdm2 = casscf.fcisolver.make_rdm12(ci, ncas, nelecas)
-    dm1, dm2 = _make_rdm12_on_mo(casdm1, casdm2, ncore, ncas, nmo)
+    dm1, dm2 = _make_rdm12_on_mo(casdm1, casdm2, ncore, ncas, nmo, sparse=sparse,
+                                 packed=packed)
 
     return dm1, dm2
 
 
-def _make_rdm12_on_mo(casdm1, casdm2, ncore, ncas, nmo):
+def _make_rdm12_on_mo(casdm1, casdm2, ncore, ncas, nmo, sparse=False, packed=False):
     '''
     Transform the 1- and 2-RDMs from the active space to the MO basis.
 
@@ -45,29 +50,154 @@ def _make_rdm12_on_mo(casdm1, casdm2, ncore, ncas, nmo):
         The number of active orbitals.
     nmo : int
         The number of molecular orbitals.
+    sparse : bool (optional)
+        If True, do not build the (nmo, nmo, nmo, nmo) array. dm2 is instead
+        a dict holding casdm1, casdm2, ncore, ncas and nmo, from which the
+        core contributions follow in closed form (see contract_dm2).
+        Default is False.
+    packed : bool (optional)
+        If True, dm2 is stored pair-packed with shape (npair, npair),
+        npair = nmo * (nmo + 1) // 2, indexed by p * (p + 1) // 2 + q for
+        p >= q. Only the part of dm2 symmetric under p <-> q and r <-> s is
+        kept, which is all that survives contraction with real integrals.
+        Use unpack_dm2 to recover a (nmo, nmo, nmo, nmo) array.
+        Default is False.
     
     Returns
     -------
     dm1 : np.ndarray
         The 1-RDM in the MO basis.
-    dm2 : np.ndarray
-        The 2-RDM in the MO basis.
+    dm2 : np.ndarray or dict
+        The 2-RDM in the MO basis. Has the dtype of casdm1 and casdm2, so
+        float32 inputs give a float32 array.
     '''
     # script to add the frozen section to density matrices
     nocc = ncas + ncore
-    dm1 = np.zeros((nmo, nmo))
+    dtype = np.result_type(casdm1, casdm2)
+    dm1 = np.zeros((nmo, nmo), dtype=dtype)
     idx = np.arange(ncore)
     dm1[idx, idx] = 2
     dm1[ncore:nocc, ncore:nocc] = casdm1
+    if sparse and packed:
+        raise ValueError("sparse and packed are mutually exclusive")
+    if packed:
+        return dm1, _make_rdm2_packed(casdm1, casdm2, ncore, ncas, nmo, dtype)
+    if sparse:
+        return dm1, {'casdm1': casdm1, 'casdm2': casdm2,
+                     'ncore': ncore, 'ncas': ncas, 'nmo': nmo}
 
-    dm2 = np.zeros((nmo, nmo, nmo, nmo))
+    dm2 = np.zeros((nmo, nmo, nmo, nmo), dtype=dtype)
     dm2[ncore:nocc, ncore:nocc, ncore:nocc, ncore:nocc] = casdm2
-    for i in range(ncore):
-        for j in range(ncore):
-            dm2[i, i, j, j] += 4
-            dm2[i, j, j, i] += -2
-        dm2[i, i, ncore:nocc, ncore:nocc] = dm2[ncore:nocc, ncore:nocc, i,
-                                                i] = 2 * casdm1
-        dm2[i, ncore:nocc, ncore:nocc, i] = dm2[ncore:nocc, i, i,
-                                                ncore:nocc] = -casdm1
-    return dm1, dm2
\ No newline at end of file
+    # core-core block, written for all (i, j) pairs at once
+    ic = idx[:, None]
+    jc = idx[None, :]
+    dm2[ic, ic, jc, jc] += 4
+    dm2[ic, jc, jc, ic] += -2
+    # core-active coupling, broadcast over the core index
+    two_casdm1 = 2 * casdm1
+    dm2[idx, idx, ncore:nocc, ncore:nocc] = two_casdm1
+    dm2[ncore:nocc, ncore:nocc, idx, idx] = two_casdm1[:, :, None]
+    dm2[idx, ncore:nocc, ncore:nocc, idx] = -casdm1
+    dm2[ncore:nocc, idx, idx, ncore:nocc] = -casdm1[:, None, :]
+    return dm1, dm2
+
+
+def _make_rdm2_packed(casdm1, casdm2, ncore, ncas, nmo, dtype):
+    '''
+    Build the pair-packed, (p <-> q)-symmetrised MO-basis 2-RDM.
+    '''
+    nocc = ncas + ncore
+    npair = nmo * (nmo + 1) // 2
+    dm2 = np.zeros((npair, npair), dtype=dtype)
+    idx = np.arange(ncore)
+    act = np.arange(ncore, nocc)
+
+    # active-active block, in the same p >= q ordering as ao2mo.restore
+    p, q = np.tril_indices(ncas)
+    act_pairs = act[p] * (act[p] + 1) // 2 + act[q]
+    casdm2_sym = 0.5 * (casdm2 + casdm2.transpose(1, 0, 2, 3))
+    dm2[np.ix_(act_pairs, act_pairs)] = _pack_pairs(casdm2_sym)
+
+    # core-core block: dm2[i,i,j,j] = 4, and the -2 exchange on dm2[i,j,j,i]
+    # becomes -1 on both the (ij, ij) pair after symmetrisation
+    core_diag = idx * (idx + 1) // 2 + idx
+    dm2[np.ix_(core_diag, core_diag)] = 4
+    dm2[core_diag, core_diag] -= 2
+    i, j = np.tril_indices(ncore, -1)
+    core_pairs = i * (i + 1) // 2 + j
+    dm2[core_pairs, core_pairs] = -1
+
+    # core-active coupling; every active index is above every core index
+    two_casdm1 = 2 * casdm1[p, q]
+    dm2[np.ix_(core_diag, act_pairs)] = two_casdm1
+    dm2[np.ix_(act_pairs, core_diag)] = two_casdm1[:, None]
+    mixed = act[None, :] * (act[None, :] + 1) // 2 + idx[:, None]
+    dm2[mixed[:, :, None], mixed[:, None, :]] = -0.5 * casdm1
+    return dm2
+
+
+def _pack_pairs(a):
+    '''
+    Pack an (n, n, n, n) array to (npair, npair) over p >= q and r >= s.
+    Indexes directly rather than through ao2mo.restore, which only takes float64.
+    '''
+    p, q = np.tril_indices(a.shape[0])
+    return a[p[:, None], q[:, None], p[None, :], q[None, :]]
+
+
+def unpack_dm2(dm2, nmo):
+    '''
+    Expand a pair-packed 2-RDM from _make_rdm12_on_mo(..., packed=True) to shape (nmo, nmo, nmo, nmo).
+    '''
+    pq = np.arange(nmo)
+    hi = np.maximum(pq[:, None], pq[None, :])
+    pair = hi * (hi + 1) // 2 + np.minimum(pq[:, None], pq[None, :])
+    return dm2[pair[:, :, None, None], pair[None, None, :, :]]
+
+
+def contract_dm2(dm2, eri):
+    '''
+    Fully contract a 2-RDM with two-electron integrals, sum_pqrs dm2[p,q,r,s] * eri[p,q,r,s].
+
+    Parameters
+    ----------
+    dm2 : np.ndarray or dict
+        The 2-RDM in the MO basis: dense, pair-packed from
+        _make_rdm12_on_mo(..., packed=True), or the sparse form from
+        _make_rdm12_on_mo(..., sparse=True).
+    eri : np.ndarray
+        The (nmo, nmo, nmo, nmo) two-electron integrals in the MO basis.
+        For a packed dm2 the 4-fold packed (npair, npair) form is also accepted.
+
+    Returns
+    -------
+    float
+        The contracted value.
+    '''
+    if isinstance(dm2, np.ndarray) and dm2.ndim == 2:
+        nmo = int(np.sqrt(2 * dm2.shape[0] + 0.25) - 0.5)
+        if eri.ndim == 4:
+            eri = _pack_pairs(eri)
+        # off-diagonal pairs stand for both (p, q) and (q, p)
+        weights = 2 * np.ones(dm2.shape[0])
+        weights[np.arange(nmo) * (np.arange(nmo) + 3) // 2] = 1
+        return weights @ (dm2 * eri) @ weights
+    if not isinstance(dm2, dict):
+        return np.einsum('pqrs,pqrs->', dm2, eri)
+
+    ncore = dm2['ncore']
+    nocc = ncore + dm2['ncas']
+    casdm1 = dm2['casdm1']
+    core = slice(0, ncore)
+    act = slice(ncore, nocc)
+    # active-active block
+    result = np.einsum('pqrs,pqrs->', dm2['casdm2'], eri[act, act, act, act])
+    # core-core block: 4 on dm2[i,i,j,j], -2 on dm2[i,j,j,i]
+    result += 4 * np.einsum('iijj->', eri[core, core, core, core])
+    result -= 2 * np.einsum('ijji->', eri[core, core, core, core])
+    # core-active coupling
+    result += 2 * np.einsum('iiab,ab->', eri[core, core, act, act], casdm1)
+    result += 2 * np.einsum('abii,ab->', eri[act, act, core, core], casdm1)
+    result -= np.einsum('iabi,ab->', eri[core, act, act, core], casdm1)
+    result -= np.einsum('aiib,ab->', eri[act, core, core, act], casdm1)
+    return result
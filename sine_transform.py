@@ -1,11 +1,157 @@
 import numpy as np
+from collections import OrderedDict
 import scipy.integrate as spi
+from scipy.fft import dst
+import math
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# Points between exact sin evaluations in the Numba sine recurrence
+RESEED = 1024
+
+# Total bytes of sine kernels kept between calls by build_kernel
+KERNEL_CACHE_BYTES = 64 * 2**20
+_kernel_cache = OrderedDict()
 
 def integrate(y, dx):
     #  return np.sum(y) * dx
     return spi.trapezoid(y, dx=dx)
 
-def calc_pdf(data):
+def _pdf_dst(q, y, r, dq, oversample=4):
+    """
+    Evaluate the sine transform with a type-I discrete sine transform.
+
+    The trapezoid-weighted integrand is placed on the grid q_n = (n + 1) * dq,
+    zero-padded so the native DST r-grid is `oversample` times finer than `r`,
+    and the result is linearly interpolated back onto `r`.
+    """
+    offset = int(round(q[0] / dq))
+    if not np.isclose(offset * dq, q[0]):
+        raise ValueError("DST method requires q values on integer multiples of dq")
+    weights = np.ones_like(q)
+    weights[[0, -1]] = 0.5
+    g = y * q * weights * dq
+    if offset == 0:
+        # The q = 0 point contributes nothing to the sine transform
+        g = g[1:]
+        offset = 1
+    no_dst = max(int(np.ceil(oversample * np.pi * (len(r) - 1))) - 1, offset + len(g))
+    x = np.zeros(no_dst)
+    x[offset - 1:offset - 1 + len(g)] = g
+    r_dst = np.pi * np.arange(1, no_dst + 1) / ((no_dst + 1) * dq)
+    pdf_dst = r_dst / np.pi * 0.5 * dst(x, type=1)
+    return np.interp(r, np.concatenate(([0.0], r_dst)), np.concatenate(([0.0], pdf_dst)))
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pdf_numba(q, y, r, dq):
+        """
+        Trapezoid sine transform evaluated point by point, without the sine matrix.
+
+        Along the uniform q-grid sin(r q) follows the recurrence
+        sin(r (q + dq)) = 2 cos(r dq) sin(r q) - sin(r (q - dq)), so each term
+        costs a multiply-add instead of a sin call. The recurrence is reseeded
+        every RESEED points to stop rounding errors building up.
+        """
+        n_r = len(r)
+        n_q = len(q)
+        # trapezoid weights folded into the integrand
+        yq = y * q
+        yq[0] *= 0.5
+        yq[n_q - 1] *= 0.5
+        pdf = np.empty(n_r)
+        for i in prange(n_r):
+            rr = r[i]
+            c = 2.0 * math.cos(rr * dq)
+            s = 0.0
+            for j in range(n_q):
+                if j % RESEED == 0:
+                    sin_prev = math.sin(rr * (q[j] - dq))
+                    sin_cur = math.sin(rr * q[j])
+                s += yq[j] * sin_cur
+                sin_prev, sin_cur = sin_cur, c * sin_cur - sin_prev
+            pdf[i] = rr / math.pi * s * dq
+        return pdf
+
+def build_kernel(q):
+    """
+    Build the sine transform kernel for a q-grid.
+
+    Parameters
+    ----------
+    q : np.ndarray
+        The uniformly spaced q values.
+
+    Returns
+    -------
+    r : np.ndarray
+        The r values of the PDF.
+    kernel : np.ndarray
+        sin(r q) * q, of shape (len(r), len(q)).
+    dq : float
+        The q spacing.
+    """
+    q = np.ascontiguousarray(q, dtype=np.float64)
+    key = q.tobytes()
+    if key in _kernel_cache:
+        _kernel_cache.move_to_end(key)
+        r, kernel = _kernel_cache[key]
+    else:
+        r, kernel = _sine_kernel(q)
+        # keep recently used kernels while they fit in KERNEL_CACHE_BYTES
+        if kernel.nbytes <= KERNEL_CACHE_BYTES:
+            _kernel_cache[key] = (r, kernel)
+            while sum(k.nbytes for _, k in _kernel_cache.values()) > KERNEL_CACHE_BYTES:
+                _kernel_cache.popitem(last=False)
+    return r, kernel, q[1] - q[0]
+
+def _sine_kernel(q):
+    """
+    Body of build_kernel. The returned arrays may be shared between calls
+    through the kernel cache and so are read-only.
+    """
+    dq = q[1] - q[0]
+    r = np.linspace(0, 1 / dq, len(q))
+    # built in place so only one N x N array is ever allocated
+    kernel = np.outer(r, q)
+    np.sin(kernel, out=kernel)
+    kernel *= q
+    r.setflags(write=False)
+    kernel.setflags(write=False)
+    return r, kernel
+
+def apply_kernel(kernel, r, dq, y):
+    """
+    Apply a kernel from build_kernel to the scattering intensities y.
+    y may be 2-D, with one dataset per column.
+    """
+    # trapezoid rule along q as a single matrix product
+    weights = np.full(len(y), dq)
+    weights[[0, -1]] *= 0.5
+    return (r / np.pi * (kernel @ (y.T * weights).T).T).T
+
+def _pdf_blocked(q, y, r, dq, block_size):
+    """
+    Trapezoid sine transform of the columns of y, block_size r values at a time.
+    Each block of sines is evaluated once and shared by every column.
+    """
+    weights = np.full(len(q), dq)
+    weights[[0, -1]] *= 0.5
+    qw = y * (q * weights)[:, None]
+    pdf = np.empty((len(r), y.shape[1]))
+    for start in range(0, len(r), block_size):
+        stop = start + block_size
+        sin_rq = np.outer(r[start:stop], q)
+        np.sin(sin_rq, out=sin_rq)
+        pdf[start:stop] = sin_rq @ qw
+    pdf *= (r / np.pi)[:, None]
+    return pdf
+
+def calc_pdf(data, block_size=None, method="quad", kernel=None, return_integrand=True):
     """
     Calculate the PDF of the data using the sine transform.
 
@@ -14,6 +160,25 @@ def calc_pdf(data):
     data : np.ndarray
         The data to calculate the PDF of. Can be directly read from a file using np.loadtxt.
         Atomic units are assumed.
+    block_size : int (optional)
+        If given, transform block_size r values at a time instead of using
+        the cached kernel from build_kernel. Bounds the intermediate sine
+        matrix to block_size x len(q). Default is None, which uses the
+        cached kernel when it fits in KERNEL_CACHE_BYTES and blocks of 256
+        otherwise.
+    method : str (optional)
+        "quad" evaluates the trapezoid quadrature directly on the r-grid.
+        "dst" uses an O(N log N) discrete sine transform interpolated onto
+        the same r-grid; the q values must lie on multiples of dq.
+        "numba" evaluates the quadrature in a parallel Numba loop without
+        storing any sine matrix; requires numba.
+        Default is "quad".
+    kernel : tuple (optional)
+        A precomputed (r, kernel, dq) from build_kernel for the q-grid of
+        data. Lets datasets on the same grid share one sine matrix.
+        Overrides block_size and method when given.
+    return_integrand : bool (optional)
+        Whether to build and return V_ee_int. Default is True.
 
     Returns
     -------
@@ -22,22 +187,77 @@ def calc_pdf(data):
     pdf : np.ndarray
         The PDF values.
     V_ee_int : np.ndarray
-        The integrand of the electron-electron interaction energy.
+        The integrand of the electron-electron interaction energy. Only
+        returned if return_integrand is True.
     
     """
-    q = data[:, 0]
-    dq = data[1, 0] - data[0, 0]
+    return calc_pdfs([data], block_size=block_size, method=method, kernel=kernel,
+                     return_integrand=return_integrand)[0]
+
+def calc_pdfs(datasets, block_size=None, method="quad", kernel=None, return_integrand=True):
+    """
+    Calculate the PDFs of several datasets on the same q-grid in one pass, so
+    each sine is evaluated once however many datasets there are.
+
+    Parameters
+    ----------
+    datasets : list of np.ndarray
+        The datasets, each as accepted by calc_pdf. All must share the q-grid.
+    block_size, method, kernel, return_integrand
+        As for calc_pdf.
+
+    Returns
+    -------
+    list of tuple
+        One (r, pdf) or (r, pdf, V_ee_int) tuple per dataset, as from calc_pdf.
+    """
+    q = datasets[0][:, 0]
+    for data in datasets[1:]:
+        if not np.allclose(data[:, 0], q):
+            raise ValueError("All datasets must share the same q-grid")
+    y = np.column_stack([data[:, 1] for data in datasets])
+    dq = q[1] - q[0]
     no_points = len(q)
-    r = np.linspace(0, 1 / dq, no_points)
-    pdf = np.zeros_like(r)
-    for i, rr in enumerate(r):
-        integrand = data[:, 1] * np.sin(rr * q) * q
-        pdf[i] = 1 / np.pi * rr * integrate(integrand, dq)
+    if kernel is not None:
+        r, kernel, dq = kernel
+        pdf = apply_kernel(kernel, r, dq, y)
+        # the kernel's r may be shared through the cache and is read-only
+        r = r.copy()
+    elif method == "numba":
+        r = np.linspace(0, 1 / dq, no_points)
+        if not HAS_NUMBA:
+            raise ImportError("method='numba' requires numba to be installed")
+        q = np.ascontiguousarray(q)
+        pdf = np.column_stack([_pdf_numba(q, np.ascontiguousarray(col), r, dq) for col in y.T])
+    elif method == "dst":
+        r = np.linspace(0, 1 / dq, no_points)
+        pdf = np.column_stack([_pdf_dst(q, col, r, dq) for col in y.T])
+    elif method == "quad" and block_size is None and 8 * no_points**2 <= KERNEL_CACHE_BYTES:
+        r, kernel, dq = build_kernel(q)
+        pdf = apply_kernel(kernel, r, dq, y)
+        r = r.copy()
+    elif method == "quad":
+        r = np.linspace(0, 1 / dq, no_points)
+        pdf = _pdf_blocked(q, y, r, dq, block_size or 256)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    return [_summarise_pdf(r if i == 0 else r.copy(), pdf[:, i].copy(), return_integrand)
+            for i in range(len(datasets))]
+
+def _summarise_pdf(r, pdf, return_integrand):
+    """
+    Print the integral and V_ee of one PDF and build calc_pdf's return value.
+    """
     integral = integrate(pdf, r[1] - r[0])
     print(f"Integral = {integral:10.8f}")
 
-    V_ee_int = np.zeros_like(pdf)
-    V_ee_int[1:] = pdf[1:] / r[1:]
-    V_ee = integrate(V_ee_int, r[1] - r[0])
+    # trapezoid rule on pdf / r written out directly; the r = 0 term is zero
+    dr = r[1] - r[0]
+    V_ee_terms = pdf[1:] / r[1:]
+    V_ee = (np.sum(V_ee_terms) - 0.5 * V_ee_terms[-1]) * dr
     print(f"V_ee     = {V_ee:10.8f}")
+    if not return_integrand:
+        return r, pdf
+    V_ee_int = np.zeros_like(pdf)
+    V_ee_int[1:] = V_ee_terms
     return r, pdf, V_ee_int